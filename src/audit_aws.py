@@ -1,14 +1,20 @@
 import boto3
+import csv
+import dataclasses
+import functools
+import io
+import itertools
 import logging
+import threading
+import time
 import concurrent.futures
 from datetime import datetime, timezone
-from typing import List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
-from pydantic import BaseModel, Field
 from rich.console import Console
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 # --- Configuration ---
 logging.basicConfig(
@@ -19,20 +25,51 @@ logging.basicConfig(
 logger = logging.getLogger("IAMAuditor")
 
 DAYS_LIMIT = 90
+SECONDS_PER_DAY = 86400
+# Matched by ARN so a customer policy that happens to be named
+# "AdministratorAccess" isn't mistaken for the AWS managed one
+ADMIN_ARNS = frozenset([
+    'arn:aws:iam::aws:policy/AdministratorAccess',
+    'arn:aws:iam::aws:policy/IAMFullAccess',
+])
+# Threads shared by every user's admin-check listings. With the default 16
+# audit workers this keeps in-flight calls within max_pool_connections.
+ADMIN_CHECK_WORKERS = 16
+PROGRESS_BATCH = 32  # results per progress-bar update
+CREDENTIAL_REPORT_TIMEOUT = 60  # seconds to wait for AWS to build the report
+CREDENTIAL_REPORT_POLL_INTERVAL = 2
+# AWS serves a cached report for up to 4 hours. Keys or MFA changed after it
+# was generated don't show up in it, so an older report is ignored. Runs 1-4
+# hours after AWS last built the report therefore pay for per-user MFA and
+# key calls on top of the two report calls.
+CREDENTIAL_REPORT_MAX_AGE = 60 * 60
+
+# Pool sized above max_workers so concurrent calls reuse warm TLS connections.
+# Adaptive retries share one rate limiter across all worker threads, so
+# throttled workers back off together instead of retrying in lockstep.
+IAM_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+)
 
 
-# --- Pydantic Models ---
-class AccessKey(BaseModel):
+# --- Models ---
+# Plain slotted dataclasses: built for every user and key on the hot path,
+# and only ever filled from AWS responses, so no validation is needed.
+@dataclasses.dataclass(slots=True)
+class AccessKey:
     access_key_id: str
     age_days: int
     status: str
     is_old: bool
 
-class UserAudit(BaseModel):
+@dataclasses.dataclass(slots=True)
+class UserAudit:
     username: str
     mfa_enabled: bool
-    keys: List[AccessKey] = Field(default_factory=list)
     is_admin: bool
+    keys: List[AccessKey] = dataclasses.field(default_factory=list)
     has_inline_admin: bool = False
     error: Optional[str] = None
 
@@ -49,12 +86,42 @@ class UserAudit(BaseModel):
         return "OK"
 
 
+# --- Policy Helpers ---
+def _is_wildcard(value: Any) -> bool:
+    """True if an Action/Resource value is '*' or a list containing '*'."""
+    return value == '*' or (isinstance(value, list) and '*' in value)
+
+
+def is_admin_policy_document(doc: dict) -> bool:
+    """True if any Allow statement grants Action:* on Resource:*."""
+    statements = doc.get('Statement', [])
+    # A policy with a single statement may give it as an object, not a list
+    if isinstance(statements, dict):
+        statements = [statements]
+    return any(
+        s.get('Effect') == 'Allow' and _is_wildcard(s.get('Action')) and _is_wildcard(s.get('Resource'))
+        for s in statements
+    )
+
+
+def _report_has_keys(row: Dict[str, str]) -> bool:
+    """True if a credential report row shows an access key in either slot."""
+    return any(row.get(f'access_key_{n}_last_rotated', 'N/A') not in ('N/A', '') for n in ('1', '2'))
+
+
+def _age_days(created: datetime, now_ts: float) -> int:
+    """Whole days between an aware datetime and an epoch timestamp, without a timedelta."""
+    return int((now_ts - created.timestamp()) // SECONDS_PER_DAY)
+
+
 # --- Auditor Class ---
 class IAMAuditor:
-    def __init__(self, max_workers: int = 10):
+    def __init__(self, max_workers: int = 16):
         self.max_workers = max_workers
+        # Groups are shared by many users; scan each one once per auditor
+        self._group_admin_cache: Dict[str, tuple[bool, bool]] = {}
+        self._group_cache_lock = threading.Lock()
         try:
-            self.iam = boto3.client('iam')
             # Verify credentials early
             self.iam.get_user()
         except NoCredentialsError:
@@ -65,19 +132,26 @@ class IAMAuditor:
             # but it's good to log.
             logger.warning(f"Could not verify identity: {e}")
 
-    @retry(
-        retry=retry_if_exception_type(ClientError),
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
+    @functools.cached_property
+    def iam(self):
+        """
+        The IAM client, built once and shared by every worker thread.
+        botocore clients are thread-safe; a per-thread client would throw
+        away the shared connection pool.
+        """
+        return boto3.client('iam', config=IAM_CLIENT_CONFIG)
+
     def _get_api_call(self, func, **kwargs):
-        """Wrapper for AWS API calls with retry logic for throttling."""
+        """
+        Wrapper for AWS API calls.
+        Throttling is retried by botocore (see IAM_CLIENT_CONFIG); a
+        Throttling error reaching here means the retry budget ran out.
+        """
         try:
             return func(**kwargs)
         except ClientError as e:
             if e.response['Error']['Code'] == 'Throttling':
-                logger.warning("Throttling detected, retrying...")
-                raise e
+                logger.warning("Throttling persisted after client retries")
             raise
 
     def get_all_users(self) -> List[str]:
@@ -85,7 +159,8 @@ class IAMAuditor:
         users = []
         try:
             paginator = self.iam.get_paginator('list_users')
-            for page in paginator.paginate():
+            # 1000 is the IAM maximum; the default of 100 costs 10x the round-trips
+            for page in paginator.paginate(PaginationConfig={'PageSize': 1000}):
                 for user in page['Users']:
                     users.append(user['UserName'])
         except ClientError as e:
@@ -93,6 +168,71 @@ class IAMAuditor:
             raise
         return users
 
+    def get_credential_report(self) -> Dict[str, Dict[str, str]]:
+        """
+        Fetch the account credential report, keyed by username.
+        One call covers MFA state and key presence for every user.
+        Returns an empty dict if the report is unavailable or older than
+        CREDENTIAL_REPORT_MAX_AGE, so callers fall back to per-user API calls.
+        """
+        deadline = time.monotonic() + CREDENTIAL_REPORT_TIMEOUT
+        try:
+            while self._get_api_call(self.iam.generate_credential_report)['State'] != 'COMPLETE':
+                if time.monotonic() > deadline:
+                    logger.warning("Credential report not ready in time, falling back to per-user checks")
+                    return {}
+                time.sleep(CREDENTIAL_REPORT_POLL_INTERVAL)
+            resp = self._get_api_call(self.iam.get_credential_report)
+        except ClientError as e:
+            logger.warning(f"Could not fetch credential report, falling back to per-user checks: {e}")
+            return {}
+
+        generated = resp.get('GeneratedTime')
+        if generated is not None:
+            if generated.tzinfo is None:
+                generated = generated.replace(tzinfo=timezone.utc)
+            if time.time() - generated.timestamp() > CREDENTIAL_REPORT_MAX_AGE:
+                logger.warning(f"Credential report generated at {generated.isoformat()} is stale, falling back to per-user checks")
+                return {}
+
+        reader = csv.DictReader(io.StringIO(resp['Content'].decode('utf-8')))
+        return {row['user']: row for row in reader}
+
+    def get_admin_snapshot(self) -> Dict[str, tuple[bool, bool]]:
+        """
+        Resolve admin access for every user from one GetAccountAuthorizationDetails scan.
+        Returns {username: (is_managed_admin, is_inline_admin)}, or an empty
+        dict if the scan is denied, so callers fall back to get_all_users and
+        check_admin_access.
+        """
+        user_details = []
+        group_admin: Dict[str, tuple[bool, bool]] = {}
+        try:
+            paginator = self.iam.get_paginator('get_account_authorization_details')
+            for page in paginator.paginate(Filter=['User', 'Group'], PaginationConfig={'PageSize': 1000}):
+                user_details.extend(page.get('UserDetailList', []))
+                for g in page.get('GroupDetailList', []):
+                    group_admin[g['GroupName']] = self._admin_from_details(g, 'GroupPolicyList')
+        except ClientError as e:
+            logger.warning(f"Could not fetch authorization details, falling back to per-user checks: {e}")
+            return {}
+
+        snapshot = {}
+        for u in user_details:
+            is_managed, is_inline = self._admin_from_details(u, 'UserPolicyList')
+            for group_name in u.get('GroupList', []):
+                g_managed, g_inline = group_admin.get(group_name, (False, False))
+                is_managed = is_managed or g_managed
+                is_inline = is_inline or g_inline
+            snapshot[u['UserName']] = (is_managed, is_inline)
+        return snapshot
+
+    def _admin_from_details(self, entity: dict, inline_key: str) -> tuple[bool, bool]:
+        """Returns (is_managed_admin, is_inline_admin) for a GAAD user or group entry."""
+        is_managed = any(p['PolicyArn'] in ADMIN_ARNS for p in entity.get('AttachedManagedPolicies', []))
+        is_inline = any(is_admin_policy_document(p['PolicyDocument']) for p in entity.get(inline_key, []))
+        return is_managed, is_inline
+
     def check_mfa(self, username: str) -> bool:
         try:
             response = self._get_api_call(self.iam.list_mfa_devices, UserName=username)
@@ -101,16 +241,18 @@ class IAMAuditor:
             logger.error(f"Error checking MFA for {username}: {e}")
             return False
 
-    def check_keys(self, username: str) -> List[AccessKey]:
+    def check_keys(self, username: str, now: Optional[datetime] = None) -> List[AccessKey]:
         keys = []
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
         try:
+            # IAM caps users at 2 access keys, so one unpaginated call is complete
             response = self._get_api_call(self.iam.list_access_keys, UserName=username)
             for k in response['AccessKeyMetadata']:
                 create_date = k['CreateDate']
                 if create_date.tzinfo is None:
                     create_date = create_date.replace(tzinfo=timezone.utc)
                 
-                age = (datetime.now(timezone.utc) - create_date).days
+                age = _age_days(create_date, now_ts)
                 is_old = age > DAYS_LIMIT
                 
                 keys.append(AccessKey(
@@ -123,46 +265,96 @@ class IAMAuditor:
             logger.error(f"Error checking keys for {username}: {e}")
         return keys
 
-    def check_admin_access(self, username: str) -> tuple[bool, bool]:
+    def check_admin_access(
+        self,
+        username: str,
+        pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    ) -> tuple[bool, bool]:
         """
-        Checks for AdministratorAccess in:
+        Checks for AdministratorAccess/IAMFullAccess (see ADMIN_ARNS) in:
         1. Attached Managed Policies (User & Groups)
         2. Inline Policies (User & Groups) - looking for Action:* Resource:*
         Returns: (is_managed_admin, is_inline_admin)
+        Each listing is checked on its own, so a failed call can't hide an
+        admin grant found by another. The listings run on `pool`; run() passes
+        one shared by every user, otherwise a pool is made for this call.
         """
+        if pool is None:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=ADMIN_CHECK_WORKERS) as pool:
+                return self.check_admin_access(username, pool)
+
         is_managed = False
         is_inline = False
 
-        try:
-            # 1. Managed Policies (Direct)
-            attached = self._get_api_call(self.iam.list_attached_user_policies, UserName=username)
-            for p in attached['AttachedPolicies']:
-                if p['PolicyName'] == 'AdministratorAccess':
-                    is_managed = True
-
-            # 2. Managed Policies (Groups)
-            groups = self._get_api_call(self.iam.list_groups_for_user, UserName=username)
-            for group in groups['Groups']:
-                g_attached = self._get_api_call(self.iam.list_attached_group_policies, GroupName=group['GroupName'])
-                for p in g_attached['AttachedPolicies']:
-                    if p['PolicyName'] == 'AdministratorAccess':
-                        is_managed = True
-                
-                # Inline Group Policies
-                g_inline = self._get_api_call(self.iam.list_group_policies, GroupName=group['GroupName'])
-                for p_name in g_inline['PolicyNames']:
-                    if self._check_inline_policy_doc(group['GroupName'], p_name, is_group=True):
-                        is_inline = True
-
-            # 3. Inline Policies (Direct)
-            u_inline = self._get_api_call(self.iam.list_user_policies, UserName=username)
-            for p_name in u_inline['PolicyNames']:
-                if self._check_inline_policy_doc(username, p_name, is_group=False):
-                    is_inline = True
+        # The three listings are independent, so issue them together
+        attached_f = pool.submit(self._get_api_call, self.iam.list_attached_user_policies, UserName=username)
+        groups_f = pool.submit(self._get_api_call, self.iam.list_groups_for_user, UserName=username)
+        u_inline_f = pool.submit(self._get_api_call, self.iam.list_user_policies, UserName=username)
+
+        # 1. Managed Policies (Direct)
+        attached = self._listing_result(attached_f, "attached policies", username)
+        if attached and any(p['PolicyArn'] in ADMIN_ARNS for p in attached['AttachedPolicies']):
+            is_managed = True
+
+        # Fan out group scans and inline documents
+        groups = self._listing_result(groups_f, "groups", username)
+        group_fs = [
+            (group['GroupName'], pool.submit(self._get_group_admin, group['GroupName']))
+            for group in (groups['Groups'] if groups else [])
+        ]
+        u_inline = self._listing_result(u_inline_f, "inline policies", username)
+        doc_fs = [
+            pool.submit(self._check_inline_policy_doc, username, p_name, False)
+            for p_name in (u_inline['PolicyNames'] if u_inline else [])
+        ]
+
+        # 2. Managed & Inline Policies (Groups)
+        for group_name, f in group_fs:
+            scanned = self._listing_result(f, f"group {group_name}", username)
+            if scanned:
+                is_managed = is_managed or scanned[0]
+                is_inline = is_inline or scanned[1]
+
+        # 3. Inline Policies (Direct)
+        if any(f.result() for f in doc_fs):
+            is_inline = True
 
+        return is_managed, is_inline
+
+    def _listing_result(self, future: concurrent.futures.Future, what: str, username: str) -> Optional[Any]:
+        """Result of one admin-check call, or None (logged) if it failed."""
+        try:
+            return future.result()
         except ClientError as e:
-            logger.error(f"Error checking admin access for {username}: {e}")
-        
+            logger.error(f"Error checking {what} for {username}: {e}")
+            return None
+
+    def _get_group_admin(self, group_name: str) -> tuple[bool, bool]:
+        """Memoized _scan_group, safe to call from worker threads."""
+        cached = self._group_admin_cache.get(group_name)
+        if cached is None:
+            # Scan outside the lock so different groups are fetched in parallel;
+            # two workers racing on the same group just do the work twice.
+            cached = self._scan_group(group_name)
+            with self._group_cache_lock:
+                cached = self._group_admin_cache.setdefault(group_name, cached)
+        return cached
+
+    def _scan_group(self, group_name: str) -> tuple[bool, bool]:
+        """Returns (is_managed_admin, is_inline_admin) for a single group."""
+        is_managed = False
+        is_inline = False
+
+        g_attached = self._get_api_call(self.iam.list_attached_group_policies, GroupName=group_name)
+        if any(p['PolicyArn'] in ADMIN_ARNS for p in g_attached['AttachedPolicies']):
+            is_managed = True
+
+        # Inline Group Policies
+        g_inline = self._get_api_call(self.iam.list_group_policies, GroupName=group_name)
+        for p_name in g_inline['PolicyNames']:
+            if self._check_inline_policy_doc(group_name, p_name, is_group=True):
+                is_inline = True
+
         return is_managed, is_inline
 
     def _check_inline_policy_doc(self, entity_name: str, policy_name: str, is_group: bool) -> bool:
@@ -173,28 +365,39 @@ class IAMAuditor:
             else:
                 resp = self._get_api_call(self.iam.get_user_policy, UserName=entity_name, PolicyName=policy_name)
             
-            doc = resp['PolicyDocument']
-            for statement in doc.get('Statement', []):
-                if statement.get('Effect') == 'Allow':
-                    actions = statement.get('Action')
-                    resources = statement.get('Resource')
-                    
-                    # Normalize to list
-                    if isinstance(actions, str): actions = [actions]
-                    if isinstance(resources, str): resources = [resources]
-                    
-                    if '*' in actions and '*' in resources:
-                        return True
+            return is_admin_policy_document(resp['PolicyDocument'])
         except Exception as e:
             logger.warning(f"Failed to parse inline policy {policy_name} for {entity_name}: {e}")
         return False
 
-    def audit_single_user(self, username: str) -> UserAudit:
-        """Worker function to audit a single user."""
+    def audit_single_user(
+        self,
+        username: str,
+        report_row: Optional[Dict[str, str]] = None,
+        now: Optional[datetime] = None,
+        admin: Optional[tuple[bool, bool]] = None,
+        admin_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    ) -> UserAudit:
+        """
+        Worker function to audit a single user.
+        MFA state comes from the credential report row when one is available,
+        and keys are only listed for users the report shows with keys; users
+        missing from the report are checked via the API.
+        `now` is the audit's reference time for key ages. `admin` is the
+        user's entry from get_admin_snapshot(); without it the admin check
+        goes through the API on `admin_pool`.
+        """
         try:
-            mfa = self.check_mfa(username)
-            keys = self.check_keys(username)
-            is_managed_admin, is_inline_admin = self.check_admin_access(username)
+            if report_row is not None:
+                mfa = report_row.get('mfa_active') == 'true'
+                keys = self.check_keys(username, now) if _report_has_keys(report_row) else []
+            else:
+                mfa = self.check_mfa(username)
+                keys = self.check_keys(username, now)
+            if admin is not None:
+                is_managed_admin, is_inline_admin = admin
+            else:
+                is_managed_admin, is_inline_admin = self.check_admin_access(username, admin_pool)
             
             return UserAudit(
                 username=username,
@@ -212,11 +415,19 @@ class IAMAuditor:
                 error=str(e)
             )
 
-    def run(self) -> List[UserAudit]:
-        """Run the full audit concurrently."""
-        users = self.get_all_users()
-        results = []
-        
+    def run(self) -> Iterator[UserAudit]:
+        """
+        Run the full audit concurrently.
+        Yields each UserAudit as soon as its worker finishes, so callers can
+        render rows without waiting for the whole account.
+        """
+        admin_snapshot = self.get_admin_snapshot()
+        # The snapshot already lists every user; ListUsers is only needed when it was denied
+        users = list(admin_snapshot) if admin_snapshot else self.get_all_users()
+        report = self.get_credential_report()
+        # One reference time for every key age, taken once instead of per key per thread
+        now = datetime.now(timezone.utc)
+
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -224,14 +435,79 @@ class IAMAuditor:
         ) as progress:
             task = progress.add_task(f"Auditing {len(users)} users...", total=len(users))
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_to_user = {executor.submit(self.audit_single_user, u): u for u in users}
-                
-                for future in concurrent.futures.as_completed(future_to_user):
-                    results.append(future.result())
-                    progress.advance(task)
-        
-        return results
+            # The admin pool's threads only start if a user needs API admin checks.
+            # It's entered first so it outlives the workers that submit to it.
+            with concurrent.futures.ThreadPoolExecutor(max_workers=ADMIN_CHECK_WORKERS) as admin_pool, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                def submit(u: str) -> concurrent.futures.Future:
+                    return executor.submit(
+                        self.audit_single_user, u, report.get(u), now, admin_snapshot.get(u), admin_pool
+                    )
+
+                # Keep a bounded number of futures in flight rather than one per user
+                user_iter = iter(users)
+                completed = 0
+                pending = {submit(u) for u in itertools.islice(user_iter, self.max_workers * 2)}
+                while pending:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        # Refill before yielding so workers stay busy while the caller renders
+                        next_user = next(user_iter, None)
+                        if next_user is not None:
+                            pending.add(submit(next_user))
+                        yield future.result()
+                        completed += 1
+                        if completed % PROGRESS_BATCH == 0:
+                            progress.update(task, completed=completed)
+                progress.update(task, completed=completed)
+
+
+# --- Report Formatting ---
+MFA_ON = "✅ ON"
+MFA_OFF = "❌ OFF"
+NO_KEYS = "No Keys"
+KEY_OLD_ICON = "⚠️"
+KEY_OK_ICON = "✅"
+# Keyed by (is_admin, has_inline_admin)
+ADMIN_LABELS = {
+    (False, False): "No",
+    (True, False): "🚨 Managed",
+    (False, True): "🔥 INLINE",
+    (True, True): "🚨 BOTH",
+}
+STATUS_STYLES = {
+    "OK": "green",
+    "ADMIN": "yellow",
+    "NO_MFA": "yellow",
+    "OLD_KEYS": "yellow",
+    "ERROR": "red",
+}
+INLINE_ADMIN_STYLE = "red bold blink"
+# Rich markup for the Status cell, built once rather than per row
+STATUS_MARKUP = {status: f"[{style}]{status}[/{style}]" for status, style in STATUS_STYLES.items()}
+INLINE_STATUS_MARKUP = {
+    status: f"[{INLINE_ADMIN_STYLE}]{status}[/{INLINE_ADMIN_STYLE}]" for status in STATUS_STYLES
+}
+
+
+def _format_row(r: UserAudit) -> tuple[str, str, str, str, str]:
+    """Render one UserAudit as table cells."""
+    keys_display = ", ".join(
+        f"{KEY_OLD_ICON if k.is_old else KEY_OK_ICON} {k.age_days}d" for k in r.keys
+    ) or NO_KEYS
+    # Inline-only admin gets the loudest style; BOTH keeps the status colour
+    inline_only = r.has_inline_admin and not r.is_admin
+    markup = INLINE_STATUS_MARKUP if inline_only else STATUS_MARKUP
+
+    return (
+        r.username,
+        MFA_ON if r.mfa_enabled else MFA_OFF,
+        keys_display,
+        ADMIN_LABELS[(r.is_admin, r.has_inline_admin)],
+        markup[r.status],
+    )
 
 
 def main():
@@ -240,7 +516,7 @@ def main():
 
     try:
         auditor = IAMAuditor()
-        results = auditor.run()
+        scanned = 0
 
         # Table Output
         table = Table(title="AWS IAM Security Audit")
@@ -250,42 +526,12 @@ def main():
         table.add_column("Admin?", style="red")
         table.add_column("Status", style="bold")
 
-        for r in results:
-            # MFA
-            mfa_str = "✅ ON" if r.mfa_enabled else "❌ OFF"
-            
-            # Keys
-            key_strs = []
-            for k in r.keys:
-                icon = "⚠️" if k.is_old else "✅"
-                key_strs.append(f"{icon} {k.age_days}d")
-            keys_display = ", ".join(key_strs) if key_strs else "No Keys"
-
-            # Admin
-            admin_str = "No"
-            if r.is_admin: admin_str = "🚨 Managed"
-            if r.has_inline_admin: admin_str = "🔥 INLINE"
-            if r.is_admin and r.has_inline_admin: admin_str = "🚨 BOTH"
-
-            # Status Color
-            status_style = "green"
-            if r.status in ["ADMIN", "NO_MFA", "OLD_KEYS"]:
-                status_style = "yellow"
-            if r.status == "ERROR":
-                status_style = "red"
-            if "INLINE" in admin_str:
-                status_style = "red bold blink"
-
-            table.add_row(
-                r.username,
-                mfa_str,
-                keys_display,
-                admin_str,
-                f"[{status_style}]{r.status}[/{status_style}]"
-            )
+        for r in auditor.run():
+            scanned += 1
+            table.add_row(*_format_row(r))
 
         console.print(table)
-        console.print(f"\n[bold]Audit Complete.[/bold] Scanned {len(results)} users.")
+        console.print(f"\n[bold]Audit Complete.[/bold] Scanned {scanned} users.")
 
     except Exception as e:
         console.print(f"[bold red]Fatal Error:[/bold red] {e}")
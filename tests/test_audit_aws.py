@@ -2,6 +2,7 @@
 Unit tests for audit_aws.py module.
 Tests exception handling, MFA checks, and error scenarios.
 """
+import copy
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 from botocore.exceptions import ClientError, BotoCoreError
@@ -11,17 +12,30 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.audit_aws import IAMAuditor
+from src.audit_aws import (
+    IAM_CLIENT_CONFIG, AccessKey, IAMAuditor, UserAudit, _format_row, is_admin_policy_document
+)
 
 
-class TestIAMAuditorMFAChecks(unittest.TestCase):
-    """Test MFA checking logic with various error scenarios."""
+class AuditorTestCase(unittest.TestCase):
+    """Base class providing a fresh IAMAuditor with a mocked IAM client."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Build the auditor once per class; construction patches boto3."""
+        with patch('boto3.Session'):
+            cls._template = IAMAuditor()
 
     def setUp(self):
         """Set up test fixtures."""
-        with patch('boto3.Session'):
-            self.auditor = IAMAuditor()
-            self.auditor.iam = Mock()
+        self.auditor = copy.copy(self._template)
+        self.auditor.iam = Mock()
+        # copy.copy shares the template's cache; each test starts empty
+        self.auditor._group_admin_cache = {}
+
+
+class TestIAMAuditorMFAChecks(AuditorTestCase):
+    """Test MFA checking logic with various error scenarios."""
 
     def test_mfa_enabled_when_devices_exist(self):
         """Test that MFA is correctly identified as enabled."""
@@ -98,15 +112,9 @@ class TestIAMAuditorMFAChecks(unittest.TestCase):
         mock_print.assert_called_once()
 
 
-class TestIAMAuditorKeyChecks(unittest.TestCase):
+class TestIAMAuditorKeyChecks(AuditorTestCase):
     """Test access key age checking logic."""
 
-    def setUp(self):
-        """Set up test fixtures."""
-        with patch('boto3.Session'):
-            self.auditor = IAMAuditor()
-            self.auditor.iam = Mock()
-
     def test_old_keys_detection(self):
         """Test that old keys are correctly identified."""
         from datetime import datetime, timezone, timedelta
@@ -145,24 +153,56 @@ class TestIAMAuditorKeyChecks(unittest.TestCase):
         self.assertEqual(len(result), 0)
 
 
-class TestIAMAuditorAdminChecks(unittest.TestCase):
-    """Test admin access detection logic."""
+class TestIAMAuditorKeyAges(AuditorTestCase):
+    """Test key age computation in check_keys."""
 
-    def setUp(self):
-        """Set up test fixtures."""
-        with patch('boto3.Session'):
-            self.auditor = IAMAuditor()
-            self.auditor.iam = Mock()
+    def test_key_age_against_reference_time(self):
+        """Test ages are whole days relative to the supplied audit time."""
+        from datetime import datetime, timezone, timedelta
+
+        now = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+        self.auditor.iam.list_access_keys.return_value = {
+            'AccessKeyMetadata': [
+                {'AccessKeyId': 'AKIAOLD', 'CreateDate': now - timedelta(days=91, hours=1), 'Status': 'Active'},
+                {'AccessKeyId': 'AKIANEW', 'CreateDate': now - timedelta(days=90, hours=23), 'Status': 'Active'},
+            ]
+        }
+
+        keys = self.auditor.check_keys('testuser', now)
+        self.assertEqual([(k.age_days, k.is_old) for k in keys], [(91, True), (90, False)])
+
+    def test_naive_create_date_treated_as_utc(self):
+        """Test that a CreateDate without tzinfo is read as UTC."""
+        from datetime import datetime, timezone
+
+        now = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+        self.auditor.iam.list_access_keys.return_value = {
+            'AccessKeyMetadata': [
+                {'AccessKeyId': 'AKIA1', 'CreateDate': datetime(2025, 5, 31, 12, 0), 'Status': 'Active'},
+            ]
+        }
+
+        keys = self.auditor.check_keys('testuser', now)
+        self.assertEqual(keys[0].age_days, 1)
+
+
+class TestIAMAuditorAdminChecks(AuditorTestCase):
+    """Test admin access detection logic."""
 
     def test_direct_admin_policy_detected(self):
         """Test that direct AdministratorAccess policy is detected."""
         self.auditor.iam.list_attached_user_policies.return_value = {
             'AttachedPolicies': [
-                {'PolicyName': 'AdministratorAccess'}
+                {
+                    'PolicyName': 'AdministratorAccess',
+                    'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'
+                }
             ]
         }
+        self.auditor.iam.list_groups_for_user.return_value = {'Groups': []}
+        self.auditor.iam.list_user_policies.return_value = {'PolicyNames': []}
         result = self.auditor.check_admin_access('testuser')
-        self.assertTrue(result)
+        self.assertEqual(result, (True, False))
 
     def test_group_admin_policy_detected(self):
         """Test that AdministratorAccess via group is detected."""
@@ -174,11 +214,320 @@ class TestIAMAuditorAdminChecks(unittest.TestCase):
         }
         self.auditor.iam.list_attached_group_policies.return_value = {
             'AttachedPolicies': [
-                {'PolicyName': 'AdministratorAccess'}
+                {
+                    'PolicyName': 'AdministratorAccess',
+                    'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'
+                }
             ]
         }
+        self.auditor.iam.list_group_policies.return_value = {'PolicyNames': []}
+        self.auditor.iam.list_user_policies.return_value = {'PolicyNames': []}
         result = self.auditor.check_admin_access('testuser')
-        self.assertTrue(result)
+        self.assertEqual(result, (True, False))
+
+    def test_custom_policy_named_admin_not_flagged(self):
+        """Test that a customer policy reusing the AWS name isn't treated as admin."""
+        self.auditor.iam.list_attached_user_policies.return_value = {
+            'AttachedPolicies': [{
+                'PolicyName': 'AdministratorAccess',
+                'PolicyArn': 'arn:aws:iam::123456789012:policy/AdministratorAccess'
+            }]
+        }
+        self.auditor.iam.list_groups_for_user.return_value = {'Groups': []}
+        self.auditor.iam.list_user_policies.return_value = {'PolicyNames': []}
+
+        self.assertEqual(self.auditor.check_admin_access('testuser'), (False, False))
+
+    def test_failed_listing_keeps_direct_admin(self):
+        """Test that a denied group/inline listing doesn't hide a direct admin grant."""
+        error_response = {'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}
+        self.auditor.iam.list_attached_user_policies.return_value = {
+            'AttachedPolicies': [{
+                'PolicyName': 'AdministratorAccess',
+                'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'
+            }]
+        }
+        self.auditor.iam.list_groups_for_user.side_effect = ClientError(error_response, 'ListGroupsForUser')
+        self.auditor.iam.list_user_policies.side_effect = ClientError(error_response, 'ListUserPolicies')
+
+        self.assertEqual(self.auditor.check_admin_access('testuser'), (True, False))
+
+    def test_admin_snapshot_resolves_users_and_groups(self):
+        """Test admin detection from a GetAccountAuthorizationDetails scan."""
+        admin_doc = {'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+        mock_paginator = Mock()
+        mock_paginator.paginate.return_value = [{
+            'UserDetailList': [
+                {'UserName': 'alice', 'GroupList': ['Admins'], 'AttachedManagedPolicies': [], 'UserPolicyList': []},
+                {'UserName': 'bob', 'GroupList': [], 'AttachedManagedPolicies': [],
+                 'UserPolicyList': [{'PolicyName': 'everything', 'PolicyDocument': admin_doc}]},
+            ],
+            'GroupDetailList': [],
+        }, {
+            'UserDetailList': [
+                {'UserName': 'carol', 'GroupList': ['Developers'], 'AttachedManagedPolicies': [], 'UserPolicyList': []},
+            ],
+            'GroupDetailList': [
+                {'GroupName': 'Admins', 'GroupPolicyList': [], 'AttachedManagedPolicies': [
+                    {'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}
+                ]},
+                {'GroupName': 'Developers', 'GroupPolicyList': [], 'AttachedManagedPolicies': []},
+            ],
+        }]
+        self.auditor.iam.get_paginator.return_value = mock_paginator
+
+        snapshot = self.auditor.get_admin_snapshot()
+        self.assertEqual(snapshot, {
+            'alice': (True, False),
+            'bob': (False, True),
+            'carol': (False, False),
+        })
+        self.auditor.iam.list_attached_user_policies.assert_not_called()
+
+    def test_group_scanned_once_across_users(self):
+        """Test that a group shared by several users is only fetched once."""
+        self.auditor.iam.list_attached_user_policies.return_value = {'AttachedPolicies': []}
+        self.auditor.iam.list_user_policies.return_value = {'PolicyNames': []}
+        self.auditor.iam.list_groups_for_user.return_value = {
+            'Groups': [{'GroupName': 'Developers'}]
+        }
+        self.auditor.iam.list_attached_group_policies.return_value = {'AttachedPolicies': []}
+        self.auditor.iam.list_group_policies.return_value = {'PolicyNames': []}
+
+        for user in ('alice', 'bob', 'carol'):
+            self.assertEqual(self.auditor.check_admin_access(user), (False, False))
+        self.auditor.iam.list_attached_group_policies.assert_called_once_with(GroupName='Developers')
+        self.auditor.iam.list_group_policies.assert_called_once_with(GroupName='Developers')
+
+
+class TestIAMAuditorRun(AuditorTestCase):
+    """Test the concurrent audit driver."""
+
+    def test_iam_client_built_once(self):
+        """Test that every access returns the same shared client."""
+        with patch('boto3.client') as mock_client:
+            auditor = IAMAuditor()
+            self.assertIs(auditor.iam, auditor.iam)
+            mock_client.assert_called_once()
+
+    def test_get_all_users_follows_pages(self):
+        """Test that users from every page are returned."""
+        mock_paginator = Mock()
+        mock_paginator.paginate.return_value = [
+            {'Users': [{'UserName': 'alice'}, {'UserName': 'bob'}]},
+            {'Users': [{'UserName': 'carol'}]},
+        ]
+        self.auditor.iam.get_paginator.return_value = mock_paginator
+
+        result = self.auditor.get_all_users()
+        self.assertEqual(result, ['alice', 'bob', 'carol'])
+        self.auditor.iam.get_paginator.assert_called_once_with('list_users')
+        mock_paginator.paginate.assert_called_once_with(PaginationConfig={'PageSize': 1000})
+
+    def test_run_yields_every_user(self):
+        """Test that run() streams one result per listed user."""
+        users = [f'user{i}' for i in range(40)]
+        self.auditor.get_all_users = Mock(return_value=users)
+        self.auditor.get_credential_report = Mock(return_value={})
+        self.auditor.get_admin_snapshot = Mock(return_value={})
+        self.auditor.audit_single_user = Mock(
+            side_effect=lambda u, *_: UserAudit(username=u, mfa_enabled=True, is_admin=False)
+        )
+        results = self.auditor.run()
+        self.assertNotIsInstance(results, list)
+        # More users than the 2x-workers in-flight bound exercises the refill path
+        self.assertEqual(sorted(r.username for r in results), sorted(users))
+
+    def test_users_taken_from_admin_snapshot(self):
+        """Test that ListUsers is skipped when the snapshot already lists users."""
+        self.auditor.get_all_users = Mock(return_value=['alice', 'bob'])
+        self.auditor.get_credential_report = Mock(return_value={})
+        self.auditor.get_admin_snapshot = Mock(return_value={'alice': (True, False)})
+        self.auditor.check_mfa = Mock(return_value=True)
+        self.auditor.check_keys = Mock(return_value=[])
+
+        results = list(self.auditor.run())
+        self.assertEqual([(r.username, r.is_admin) for r in results], [('alice', True)])
+        self.auditor.get_all_users.assert_not_called()
+
+    def test_users_listed_when_snapshot_denied(self):
+        """Test that an empty snapshot falls back to ListUsers."""
+        self.auditor.get_all_users = Mock(return_value=['alice', 'bob'])
+        self.auditor.get_credential_report = Mock(return_value={})
+        self.auditor.get_admin_snapshot = Mock(return_value={})
+        self.auditor.audit_single_user = Mock(
+            side_effect=lambda u, *_: UserAudit(username=u, mfa_enabled=True, is_admin=False)
+        )
+
+        self.assertEqual(sorted(r.username for r in self.auditor.run()), ['alice', 'bob'])
+        self.auditor.get_all_users.assert_called_once()
+
+    def test_admin_pool_shut_down_after_run(self):
+        """Test that the pool shared by API admin checks doesn't outlive run()."""
+        self.auditor.get_all_users = Mock(return_value=['alice', 'bob'])
+        self.auditor.get_credential_report = Mock(return_value={})
+        self.auditor.get_admin_snapshot = Mock(return_value={})
+        self.auditor.check_mfa = Mock(return_value=True)
+        self.auditor.check_keys = Mock(return_value=[])
+        self.auditor.check_admin_access = Mock(return_value=(False, False))
+
+        list(self.auditor.run())
+        pools = {c.args[1] for c in self.auditor.check_admin_access.call_args_list}
+        self.assertEqual(len(pools), 1)
+        with self.assertRaises(RuntimeError):
+            pools.pop().submit(print)
+
+
+class TestIAMAuditorRetries(AuditorTestCase):
+    """Test that throttling retries are left to the botocore client."""
+
+    def test_client_uses_adaptive_retries(self):
+        """Test the shared client config retries adaptively, 10 attempts."""
+        self.assertEqual(IAM_CLIENT_CONFIG.retries, {'mode': 'adaptive', 'max_attempts': 10})
+
+    def test_api_call_not_retried_again(self):
+        """Test that a throttling error from the client is raised after one call."""
+        error_response = {'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}
+        func = Mock(side_effect=ClientError(error_response, 'ListUsers'))
+
+        with self.assertRaises(ClientError):
+            self.auditor._get_api_call(func, UserName='testuser')
+        func.assert_called_once_with(UserName='testuser')
+
+
+class TestIAMAuditorCredentialReport(AuditorTestCase):
+    """Test credential report parsing and its use in per-user audits."""
+
+    REPORT = (
+        "user,arn,mfa_active,access_key_1_active,access_key_1_last_rotated,"
+        "access_key_2_active,access_key_2_last_rotated\n"
+        "alice,arn:aws:iam::123456789012:user/alice,true,true,{old},false,N/A\n"
+        "bob,arn:aws:iam::123456789012:user/bob,false,false,N/A,false,N/A\n"
+    )
+
+    def _report(self, generated_ago=None):
+        from datetime import datetime, timezone, timedelta
+
+        now = datetime.now(timezone.utc)
+        old_date = now - timedelta(days=100)
+        content = self.REPORT.format(old=old_date.isoformat(timespec='seconds'))
+        self.auditor.iam.generate_credential_report.return_value = {'State': 'COMPLETE'}
+        self.auditor.iam.get_credential_report.return_value = {
+            'Content': content.encode('utf-8'),
+            'GeneratedTime': now - (generated_ago or timedelta(minutes=5)),
+        }
+        return self.auditor.get_credential_report()
+
+    def test_report_keyed_by_username(self):
+        """Test that report rows are indexed by username."""
+        report = self._report()
+        self.assertEqual(set(report), {'alice', 'bob'})
+        self.assertEqual(report['alice']['mfa_active'], 'true')
+
+    def test_report_row_replaces_per_user_calls(self):
+        """Test that MFA comes from the report and keys are listed with real IDs."""
+        from datetime import datetime, timezone, timedelta
+
+        report = self._report()
+        self.auditor.check_admin_access = Mock(return_value=(False, False))
+        self.auditor.iam.list_access_keys.return_value = {
+            'AccessKeyMetadata': [
+                {'AccessKeyId': 'AKIAALICE', 'CreateDate': datetime.now(timezone.utc) - timedelta(days=100), 'Status': 'Active'},
+            ]
+        }
+
+        result = self.auditor.audit_single_user('alice', report['alice'])
+        self.assertTrue(result.mfa_enabled)
+        self.assertEqual([k.access_key_id for k in result.keys], ['AKIAALICE'])
+        self.assertTrue(result.keys[0].is_old)
+        self.assertEqual(result.status, 'OLD_KEYS')
+        self.auditor.iam.list_mfa_devices.assert_not_called()
+        self.auditor.iam.list_access_keys.assert_called_once_with(UserName='alice')
+
+    def test_report_denied_falls_back(self):
+        """Test that an unavailable report yields an empty mapping."""
+        error_response = {
+            'Error': {
+                'Code': 'AccessDenied',
+                'Message': 'Not authorized to perform iam:GenerateCredentialReport'
+            }
+        }
+        self.auditor.iam.generate_credential_report.side_effect = ClientError(
+            error_response, 'GenerateCredentialReport'
+        )
+        self.assertEqual(self.auditor.get_credential_report(), {})
+
+    def test_stale_report_ignored(self):
+        """Test that a report older than the freshness limit isn't used."""
+        from datetime import timedelta
+
+        self.assertEqual(self._report(generated_ago=timedelta(hours=3)), {})
+
+    def test_user_without_keys_in_report(self):
+        """Test that keys aren't listed when both report slots are 'N/A'."""
+        report = self._report()
+        self.auditor.check_admin_access = Mock(return_value=(False, False))
+
+        result = self.auditor.audit_single_user('bob', report['bob'])
+        self.assertFalse(result.mfa_enabled)
+        self.assertEqual(result.keys, [])
+        self.assertEqual(result.status, 'NO_MFA')
+        self.auditor.iam.list_access_keys.assert_not_called()
+
+
+class TestReportFormatting(unittest.TestCase):
+    """Test rendering of audit results as table rows."""
+
+    def test_clean_user_row(self):
+        """Test a user with MFA, no keys and no admin access."""
+        row = _format_row(UserAudit(username='alice', mfa_enabled=True, is_admin=False))
+        self.assertEqual(row, ('alice', '✅ ON', 'No Keys', 'No', '[green]OK[/green]'))
+
+    def test_inline_admin_row_is_highlighted(self):
+        """Test that inline admin access uses the alert style."""
+        audit = UserAudit(
+            username='bob',
+            mfa_enabled=False,
+            keys=[AccessKey(access_key_id='AKIA1', age_days=120, status='Active', is_old=True)],
+            is_admin=False,
+            has_inline_admin=True
+        )
+        row = _format_row(audit)
+        self.assertEqual(row[1], '❌ OFF')
+        self.assertEqual(row[2], '⚠️ 120d')
+        self.assertEqual(row[3], '🔥 INLINE')
+        self.assertEqual(row[4], '[red bold blink]ADMIN[/red bold blink]')
+
+
+class TestAdminPolicyDocument(unittest.TestCase):
+    """Test detection of admin-equivalent inline policy documents."""
+
+    def test_wildcard_strings_detected(self):
+        """Test Action '*' on Resource '*' given as plain strings."""
+        doc = {'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+        self.assertTrue(is_admin_policy_document(doc))
+
+    def test_wildcard_in_lists_detected(self):
+        """Test '*' inside Action/Resource lists."""
+        doc = {'Statement': [
+            {'Effect': 'Allow', 'Action': ['s3:GetObject'], 'Resource': '*'},
+            {'Effect': 'Allow', 'Action': ['ec2:*', '*'], 'Resource': ['*']},
+        ]}
+        self.assertTrue(is_admin_policy_document(doc))
+
+    def test_single_statement_object_detected(self):
+        """Test a Statement given as an object rather than a list."""
+        doc = {'Statement': {'Effect': 'Allow', 'Action': '*', 'Resource': '*'}}
+        self.assertTrue(is_admin_policy_document(doc))
+
+    def test_deny_and_scoped_statements_ignored(self):
+        """Test that Deny statements and scoped grants are not admin."""
+        doc = {'Statement': [
+            {'Effect': 'Deny', 'Action': '*', 'Resource': '*'},
+            {'Effect': 'Allow', 'Action': 's3:*', 'Resource': '*'},
+            {'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'},
+        ]}
+        self.assertFalse(is_admin_policy_document(doc))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,427 @@
+"""
+Unit tests for iam_optimizer.py.bak.
+Tests AWS analysis against a mocked boto3 session.
+"""
+import importlib.machinery
+import importlib.util
+import io
+import json
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+from botocore.exceptions import ClientError
+
+# The module ships with a .bak suffix, so load it by path
+_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'iam_optimizer.py.bak'
+)
+_loader = importlib.machinery.SourceFileLoader('iam_optimizer', _PATH)
+iam_optimizer = importlib.util.module_from_spec(importlib.util.spec_from_loader('iam_optimizer', _loader))
+_loader.exec_module(iam_optimizer)
+
+ADMIN_ARN = 'arn:aws:iam::aws:policy/AdministratorAccess'
+REPORT_HEADER = (
+    "user,arn,mfa_active,access_key_1_active,access_key_1_last_rotated,"
+    "access_key_2_active,access_key_2_last_rotated\n"
+)
+
+
+class OptimizerTestCase(unittest.TestCase):
+    """Base class wiring IAMOptimizer to a mocked boto3 session."""
+
+    def setUp(self):
+        """Set up an account with two users and empty caches."""
+        iam_optimizer.IAMOptimizer.invalidate_cache()
+        now = datetime.now(timezone.utc)
+        self.users = [
+            {'UserName': 'alice', 'UserId': 'A1', 'CreateDate': now, 'GroupList': ['Admins'],
+             'AttachedManagedPolicies': [], 'UserPolicyList': []},
+            {'UserName': 'bob', 'UserId': 'B1', 'CreateDate': now, 'GroupList': [],
+             'AttachedManagedPolicies': [], 'UserPolicyList': []},
+        ]
+        self.groups = [
+            {'GroupName': 'Admins', 'GroupPolicyList': [], 'AttachedManagedPolicies': [
+                {'PolicyName': 'AdministratorAccess', 'PolicyArn': ADMIN_ARN}
+            ]},
+        ]
+        self.iam = Mock()
+        self.gaad = Mock()
+        self.gaad.paginate.side_effect = lambda **_: [
+            {'UserDetailList': self.users, 'GroupDetailList': self.groups}
+        ]
+        self.iam.get_paginator.return_value = self.gaad
+        self.iam.list_access_keys.return_value = {'AccessKeyMetadata': []}
+        self.iam.list_mfa_devices.return_value = {'MFADevices': []}
+        self.set_report(REPORT_HEADER)
+
+        self.session = Mock()
+        self.session.client.return_value = self.iam
+        self.iam.get_caller_identity.return_value = {'Account': '123456789012'}
+        patcher = patch('boto3.Session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def set_report(self, content: str, generated_ago: timedelta = timedelta(minutes=5)):
+        """Serve a credential report with the given CSV content."""
+        self.iam.generate_credential_report.return_value = {'State': 'COMPLETE'}
+        self.iam.get_credential_report.return_value = {
+            'Content': content.encode('utf-8'),
+            'GeneratedTime': datetime.now(timezone.utc) - generated_ago,
+        }
+
+    def analyze(self):
+        return iam_optimizer.IAMOptimizer('aws').run_analysis()
+
+
+class TestFindings(OptimizerTestCase):
+    """Test findings generated from the account snapshot."""
+
+    def test_admin_via_group_detected(self):
+        """Test that AdministratorAccess attached to a group flags its members."""
+        results = self.analyze()
+        admin = [f['user'] for f in results['findings'] if f['issue'] == "User has AdministratorAccess policy"]
+        self.assertEqual(admin, ['alice'])
+
+    def test_users_from_every_page(self):
+        """Test that users on later GetAccountAuthorizationDetails pages are kept."""
+        self.gaad.paginate.side_effect = lambda **_: [
+            {'UserDetailList': self.users[:1], 'GroupDetailList': self.groups},
+            {'UserDetailList': self.users[1:], 'GroupDetailList': []},
+        ]
+        results = self.analyze()
+        self.assertEqual(results['total_users'], 2)
+        self.assertEqual([u['username'] for u in results['users']], ['alice', 'bob'])
+
+    def test_denied_authorization_details_falls_back(self):
+        """Test that per-user listings replace a denied GetAccountAuthorizationDetails."""
+        self.gaad.paginate.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GetAccountAuthorizationDetails'
+        )
+        list_users = Mock()
+        list_users.paginate.return_value = [{'Users': [
+            {'UserName': 'alice', 'UserId': 'A1'}, {'UserName': 'bob', 'UserId': 'B1'}
+        ]}]
+        self.iam.get_paginator.side_effect = lambda name: (
+            list_users if name == 'list_users' else self.gaad
+        )
+        self.iam.list_groups_for_user.side_effect = lambda UserName: {
+            'Groups': [{'GroupName': 'Admins'}] if UserName == 'alice' else []
+        }
+        self.iam.list_attached_user_policies.return_value = {'AttachedPolicies': []}
+        self.iam.list_user_policies.return_value = {'PolicyNames': []}
+        self.iam.list_attached_group_policies.return_value = {
+            'AttachedPolicies': [{'PolicyName': 'AdministratorAccess', 'PolicyArn': ADMIN_ARN}]
+        }
+
+        results = self.analyze()
+        self.assertNotIn('error', results)
+        self.assertEqual(results['users'][0]['groups'], ['Admins'])
+        self.assertEqual([f['user'] for f in results['findings']], ['alice'])
+        self.iam.list_attached_group_policies.assert_called_once_with(GroupName='Admins')
+
+    def test_customer_policy_named_admin_not_flagged(self):
+        """Test that only the AWS managed ARN counts as admin."""
+        self.groups[0]['AttachedManagedPolicies'] = [
+            {'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::123456789012:policy/AdministratorAccess'}
+        ]
+        self.assertEqual(self.analyze()['findings'], [])
+
+    def test_broad_managed_policies_flagged(self):
+        """Test risky AWS policies attached directly or through a group, matched by ARN."""
+        self.groups = [{'GroupName': 'Ops', 'GroupPolicyList': [], 'AttachedManagedPolicies': [
+            {'PolicyName': 'IAMFullAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/IAMFullAccess'}
+        ]}]
+        self.users[0]['GroupList'] = ['Ops']
+        self.users[0]['AttachedManagedPolicies'] = [
+            {'PolicyName': 'PowerUserAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/PowerUserAccess'}
+        ]
+        self.users[1]['AttachedManagedPolicies'] = [
+            {'PolicyName': 'PowerUserAccess', 'PolicyArn': 'arn:aws:iam::123456789012:policy/PowerUserAccess'}
+        ]
+        findings = [(f['severity'], f['user'], f['issue']) for f in self.analyze()['findings']]
+        self.assertEqual(findings, [(
+            'MEDIUM', 'alice', "User has broad AWS managed policies: PowerUserAccess, IAMFullAccess"
+        )])
+
+
+class TestCaching(OptimizerTestCase):
+    """Test reuse of snapshots and credential reports across runs."""
+
+    def test_snapshot_reused_within_ttl(self):
+        """Test that a second run inside the TTL doesn't rescan the account."""
+        self.analyze()
+        self.analyze()
+        self.gaad.paginate.assert_called_once()
+        self.iam.get_credential_report.assert_called_once()
+
+    def test_snapshot_refetched_after_ttl(self):
+        """Test that an expired snapshot is fetched again."""
+        with patch.object(iam_optimizer, 'SNAPSHOT_TTL', -1):
+            self.analyze()
+            self.analyze()
+        self.assertEqual(self.gaad.paginate.call_count, 2)
+
+    def test_cache_bounded(self):
+        """Test that expired entries, then the oldest, are evicted on store."""
+        cache = {}
+        now = iam_optimizer.time.time()
+        with patch.object(iam_optimizer, 'CACHE_MAXSIZE', 2):
+            iam_optimizer._cache_put(cache, ('expired', None), now - 1, 'x')
+            iam_optimizer._cache_put(cache, ('a', None), now + 60, 'a')
+            iam_optimizer._cache_put(cache, ('b', None), now + 60, 'b')
+            iam_optimizer._cache_put(cache, ('c', None), now + 60, 'c')
+        self.assertEqual(list(cache), [('b', None), ('c', None)])
+
+    def test_results_do_not_share_cached_lists(self):
+        """Test that mutating returned groups leaves the cached snapshot intact."""
+        self.analyze()['users'][0]['groups'].clear()
+        self.assertEqual(self.analyze()['users'][0]['groups'], ['Admins'])
+
+    def test_report_expiry_counts_from_generation(self):
+        """Test that a report AWS could already rebuild isn't cached at all."""
+        self.set_report(REPORT_HEADER, generated_ago=timedelta(hours=4, minutes=1))
+        self.analyze()
+        self.analyze()
+        self.assertEqual(self.iam.get_credential_report.call_count, 2)
+
+    def test_stale_report_cached_as_empty(self):
+        """Test that a stale report isn't fetched again before AWS can rebuild it."""
+        self.set_report(REPORT_HEADER, generated_ago=timedelta(hours=2))
+        self.analyze()
+        self.analyze()
+        self.iam.get_credential_report.assert_called_once()
+        # Both runs check both users individually
+        self.assertEqual(self.iam.list_mfa_devices.call_count, 4)
+
+    def test_invalidate_cache(self):
+        """Test that invalidate_cache forces a fresh scan."""
+        self.analyze()
+        iam_optimizer.IAMOptimizer.invalidate_cache()
+        self.analyze()
+        self.assertEqual(self.gaad.paginate.call_count, 2)
+        self.assertEqual(self.iam.get_credential_report.call_count, 2)
+
+
+class TestCredentialReport(OptimizerTestCase):
+    """Test MFA and key data from the report versus per-user calls."""
+
+    def test_report_rows_replace_per_user_calls(self):
+        """Test that users in the report aren't listed individually."""
+        self.set_report(REPORT_HEADER + "alice,arn,true,false,N/A,false,N/A\nbob,arn,false,false,N/A,false,N/A\n")
+        results = self.analyze()
+        self.assertEqual([u['mfa_enabled'] for u in results['users']], [True, False])
+        self.iam.list_mfa_devices.assert_not_called()
+        self.iam.list_access_keys.assert_not_called()
+
+    def test_report_keys_listed_for_ids(self):
+        """Test that users the report shows with keys get their real key IDs."""
+        rotated = (datetime.now(timezone.utc) - timedelta(days=10)).isoformat(timespec='seconds')
+        self.set_report(REPORT_HEADER + f"alice,arn,true,true,{rotated},false,N/A\nbob,arn,true,false,N/A,false,N/A\n")
+        self.iam.list_access_keys.return_value = {'AccessKeyMetadata': [
+            {'AccessKeyId': 'AKIAALICE', 'Status': 'Active', 'CreateDate': datetime.now(timezone.utc)}
+        ]}
+        results = self.analyze()
+        alice = results['users'][0]
+        self.assertEqual(alice['access_keys'][0]['access_key_id'], 'AKIAALICE')
+        self.assertEqual(set(alice['access_keys'][0]), {'access_key_id', 'status', 'created'})
+        self.iam.list_access_keys.assert_called_once_with(UserName='alice')
+        self.iam.list_mfa_devices.assert_not_called()
+
+    def test_users_missing_from_report_fetched(self):
+        """Test that users absent from the report fall back to API calls."""
+        self.set_report(REPORT_HEADER + "alice,arn,true,false,N/A,false,N/A\n")
+        self.iam.list_access_keys.return_value = {'AccessKeyMetadata': [
+            {'AccessKeyId': 'AKIABOB', 'Status': 'Active', 'CreateDate': datetime.now(timezone.utc)}
+        ]}
+        results = self.analyze()
+        bob = results['users'][1]
+        self.assertEqual([k['access_key_id'] for k in bob['access_keys']], ['AKIABOB'])
+        self.iam.list_mfa_devices.assert_called_once_with(UserName='bob')
+        self.assertIn(
+            ('HIGH', 'bob'), [(f['severity'], f['user']) for f in results['findings']]
+        )
+
+    def test_key_created_after_stale_report(self):
+        """Test that a key created since an old report was built is still found."""
+        self.set_report(
+            REPORT_HEADER + "alice,arn,true,false,N/A,false,N/A\nbob,arn,false,false,N/A,false,N/A\n",
+            generated_ago=timedelta(hours=3),
+        )
+        self.iam.list_access_keys.side_effect = lambda UserName: {'AccessKeyMetadata': [
+            {'AccessKeyId': 'AKIABOB', 'Status': 'Active', 'CreateDate': datetime.now(timezone.utc)}
+        ] if UserName == 'bob' else []}
+        results = self.analyze()
+        bob = results['users'][1]
+        self.assertEqual([k['access_key_id'] for k in bob['access_keys']], ['AKIABOB'])
+        self.assertIn(
+            ('HIGH', 'bob'), [(f['severity'], f['user']) for f in results['findings']]
+        )
+
+    def test_report_unavailable_falls_back(self):
+        """Test that a denied report sends every user through the API."""
+        self.iam.generate_credential_report.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'GenerateCredentialReport'
+        )
+        self.analyze()
+        self.assertEqual(self.iam.list_mfa_devices.call_count, 2)
+
+    def test_deleted_user_skipped_other_errors_raised(self):
+        """Test that only NoSuchEntity is swallowed by the per-user calls."""
+        self.iam.list_mfa_devices.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchEntity', 'Message': 'gone'}}, 'ListMFADevices'
+        )
+        self.assertNotIn('error', self.analyze())
+
+        iam_optimizer.IAMOptimizer.invalidate_cache()
+        self.iam.list_mfa_devices.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'ListMFADevices'
+        )
+        self.assertIn('AccessDenied', self.analyze()['error'])
+
+
+class TestStreaming(OptimizerTestCase):
+    """Test the (kind, data) protocol of iter_aws_iam."""
+
+    def test_header_then_users_and_findings(self):
+        """Test item order: header first, each user before its findings."""
+        items = list(iam_optimizer.IAMOptimizer('aws').iter_aws_iam())
+        self.assertEqual([kind for kind, _ in items], ['header', 'user', 'finding', 'user'])
+        # Records stay records until an output boundary converts them
+        self.assertIsInstance(items[1][1], iam_optimizer.UserRecord)
+
+    def test_error_after_header(self):
+        """Test that a failure mid-stream ends with a single error item."""
+        self.users[1]['CreateDate'] = 'not a datetime'
+        items = list(iam_optimizer.IAMOptimizer('aws').iter_aws_iam())
+        self.assertEqual([kind for kind, _ in items], ['header', 'user', 'finding', 'error'])
+        self.assertEqual(items[-1][1]['provider'], 'aws')
+
+        results = self.analyze()
+        self.assertNotIn('users', results)
+        self.assertIn('Unexpected error', results['error'])
+    def test_api_error_carries_request_id(self):
+        """Test that an AWS API error result includes the botocore request ID."""
+        self.gaad.paginate.side_effect = ClientError({
+            'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'},
+            'ResponseMetadata': {'RequestId': 'req-123'},
+        }, 'GetAccountAuthorizationDetails')
+        results = self.analyze()
+        self.assertEqual(results['provider'], 'aws')
+        self.assertEqual(results['request_id'], 'req-123')
+        self.assertTrue(results['error'].startswith('AWS API error:'))
+
+
+class TestTextReport(unittest.TestCase):
+    """Test the text report written from a stream of analysis items."""
+
+    RULE = '=' * 70
+    DIVIDER = '─' * 70
+    USER = iam_optimizer.UserRecord(
+        username='alice', user_id='A1', created='2025-01-01T00:00:00+00:00',
+        managed_policies=[ADMIN_ARN], inline_policies=[], groups=['Admins'],
+        access_keys=[{'access_key_id': 'AKIA1', 'status': 'Active', 'created': None}],
+        mfa_enabled=False
+    )
+    HEADER = {'provider': 'aws', 'timestamp': '2025-06-01T00:00:00+00:00', 'total_users': 1}
+
+    def render(self, items):
+        """Run write_text_report over items and return what it wrote."""
+        with patch('sys.stdout', new_callable=io.StringIO) as out:
+            iam_optimizer.write_text_report('aws', iter(items))
+        return out.getvalue()
+
+    def test_users_and_findings(self):
+        """Test the exact report for a header, a user and a finding."""
+        finding = {
+            'severity': 'HIGH', 'user': 'alice',
+            'issue': 'User has active access keys but MFA is not enabled',
+            'recommendation': 'Enable MFA for all users with programmatic access'
+        }
+        text = self.render([('header', self.HEADER), ('user', self.USER), ('finding', finding)])
+        self.assertEqual(text, (
+            f"\n{self.RULE}\nCloud IAM Optimizer - AWS Analysis\n{self.RULE}\n"
+            "Timestamp: 2025-06-01T00:00:00+00:00\n"
+            "\nTotal Users: 1\n"
+            f"\n{self.DIVIDER}\nIAM Users:\n{self.DIVIDER}\n"
+            "\n👤 alice\n"
+            "   User ID: A1\n"
+            "   Created: 2025-01-01T00:00:00+00:00\n"
+            "   MFA Enabled: ❌ No\n"
+            "   Groups: Admins\n"
+            "   Managed Policies: 1\n"
+            "   Inline Policies: 0\n"
+            "   Access Keys: 1\n"
+            f"\n{self.DIVIDER}\nSecurity Findings:\n{self.DIVIDER}\n"
+            "\n🔴 [HIGH] alice\n"
+            "   Issue: User has active access keys but MFA is not enabled\n"
+            "   Recommendation: Enable MFA for all users with programmatic access\n"
+            f"\n{self.RULE}\n"
+            "For enterprise features and commercial support:\n"
+            "🌐 https://run-as-daemon.ru\n"
+            "📧 Contact: @ranas-mukminov\n"
+            f"{self.RULE}\n\n"
+        ))
+
+    def test_error_after_users(self):
+        """Test that an error mid-stream is written after the users and exits 1."""
+        error = {'provider': 'aws', 'error': 'AWS API error: denied', 'timestamp': 'ts'}
+        with patch('sys.stdout', new_callable=io.StringIO) as out, self.assertRaises(SystemExit) as cm:
+            iam_optimizer.write_text_report('aws', iter([('header', self.HEADER), ('user', self.USER), ('error', error)]))
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(out.getvalue(), (
+            f"\n{self.RULE}\nCloud IAM Optimizer - AWS Analysis\n{self.RULE}\n"
+            "Timestamp: 2025-06-01T00:00:00+00:00\n"
+            "\nTotal Users: 1\n"
+            f"\n{self.DIVIDER}\nIAM Users:\n{self.DIVIDER}\n"
+            "\n👤 alice\n"
+            "   User ID: A1\n"
+            "   Created: 2025-01-01T00:00:00+00:00\n"
+            "   MFA Enabled: ❌ No\n"
+            "   Groups: Admins\n"
+            "   Managed Policies: 1\n"
+            "   Inline Policies: 0\n"
+            "   Access Keys: 1\n"
+            "\n❌ ERROR: AWS API error: denied\n"
+        ))
+
+    def test_error_before_header(self):
+        """Test that an error with no header still gets the title and timestamp."""
+        error = {'provider': 'gcp', 'error': 'GCP SDK not installed', 'timestamp': 'ts', 'note': 'later'}
+        with patch('sys.stdout', new_callable=io.StringIO) as out, self.assertRaises(SystemExit):
+            iam_optimizer.write_text_report('gcp', iter([('error', error)]))
+        self.assertEqual(out.getvalue(), (
+            f"\n{self.RULE}\nCloud IAM Optimizer - GCP Analysis\n{self.RULE}\n"
+            "Timestamp: ts\n"
+            "\n❌ ERROR: GCP SDK not installed\n"
+            "ℹ️  later\n"
+        ))
+
+
+class TestJsonOutput(unittest.TestCase):
+    """Test JSON serialization of analysis results."""
+
+    RESULTS = {
+        'provider': 'aws', 'timestamp': '2025-06-01T00:00:00+00:00', 'total_users': 1,
+        'users': [{'username': 'alice', 'policies': {'managed': [], 'inline': []}, 'mfa_enabled': True}],
+        'findings': [],
+    }
+
+    def test_stdlib_output_matches_json_dumps(self):
+        """Test the fallback path produces the same text as before orjson."""
+        with patch.object(iam_optimizer, 'ORJSON_AVAILABLE', False):
+            text = iam_optimizer.dumps_json(self.RESULTS)
+        self.assertEqual(text, json.dumps(self.RESULTS, indent=2, default=str))
+
+    @unittest.skipUnless(iam_optimizer.ORJSON_AVAILABLE, "orjson not installed")
+    def test_orjson_output_matches_stdlib(self):
+        """Test orjson and the stdlib produce identical indented output."""
+        with patch.object(iam_optimizer, 'ORJSON_AVAILABLE', False):
+            expected = iam_optimizer.dumps_json(self.RESULTS)
+        self.assertEqual(iam_optimizer.dumps_json(self.RESULTS), expected)
+
+
+
+if __name__ == '__main__':
+    unittest.main()